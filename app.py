@@ -1,11 +1,9 @@
 import streamlit as st
-from decouple import config
 
 from gpx_route_status.pipeline import run_gpx_route_pipeline
-from gpx_route_status.utils import logfire
+from gpx_route_status.utils import configure_logfire
 
-LOGFIRE_TOKEN = config("LOGFIRE_TOKEN")
-logfire.configure(token=LOGFIRE_TOKEN)
+logfire = configure_logfire()
 st.set_page_config(layout="wide")
 
 # Streamlit app title
@@ -37,7 +35,6 @@ if uploaded_file is not None:
             gpx_file_path=uploaded_file,
             gpx_points_interval=interval,
         )
-        # loop.close()
         info.empty()
         st.subheader("GPX Route with Closed Sections Highlighted in Red")
         st.plotly_chart(fig)
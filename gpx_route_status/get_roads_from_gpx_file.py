@@ -1,30 +1,47 @@
+from __future__ import annotations
+
 import asyncio
-from collections import Counter
+import threading
+import time
+from collections import Counter, OrderedDict
 
 import httpx
-import pydash
-from aiocache import Cache
-from aiocache.serializers import JsonSerializer
-from httpx import AsyncHTTPTransport
-
-from .utils import extract_coordinates_from_gpx, sample_points
-
-transport = AsyncHTTPTransport(retries=3)
-
-async_client = httpx.AsyncClient(
-    timeout=httpx.Timeout(timeout=180, connect=30, read=30, write=30),
-    transport=transport,
+import numpy as np
+import orjson
+from decouple import config
+
+from .utils import cache_get, cache_set, sample_points
+
+# Nominatim usage policy allows at most 1 request per second. Requests of all
+# sessions in the process are spaced by the minimum interval, lower it or
+# raise the concurrency for a self-hosted instance.
+NOMINATIM_CONCURRENCY = config("NOMINATIM_CONCURRENCY", cast=int, default=1)
+NOMINATIM_MIN_INTERVAL = config(
+    "NOMINATIM_MIN_INTERVAL", cast=float, default=1.0
 )
-# Cache results for 24 hour
-cache = Cache(Cache.MEMORY, serializer=JsonSerializer(), ttl=3600 * 24)
-
-
-async def fetch_address(lat: float, lon: float) -> dict:
+# Monotonic time at which the next Nominatim request may start. It is shared
+# by all Streamlit sessions, so access goes through the lock.
+nominatim_next_request_time = 0.0
+nominatim_lock = threading.Lock()
+# The public Overpass API only grants a few request slots per IP, raise it for
+# a self-hosted instance.
+OVERPASS_CONCURRENCY = config("OVERPASS_CONCURRENCY", cast=int, default=2)
+# In-process LRU cache of addresses in front of the persistent cache. It is
+# shared by all Streamlit sessions, so access goes through the lock.
+ADDRESS_CACHE_SIZE = 50_000
+address_cache = OrderedDict()
+address_cache_lock = threading.Lock()
+
+
+async def fetch_address(
+    client: httpx.AsyncClient, lat: float, lon: float
+) -> dict:
     """
     Fetches the address information for a given latitude and longitude using
     the Nominatim API.
 
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
         lat (float): The latitude coordinate.
         lon (float): The longitude coordinate.
 
@@ -35,38 +52,153 @@ async def fetch_address(lat: float, lon: float) -> dict:
         f"https://nominatim.openstreetmap.org/reverse?format=json&lat"
         f"={lat}&lon={lon}&zoom=18&addressdetails=1"
     )
-    response = await async_client.get(url)
-    return response.json()
+    response = await client.get(url)
+    return orjson.loads(response.content)
 
 
-async def get_road_address(lat: float, lon: float) -> dict:
+async def wait_for_nominatim_slot() -> None:
     """
-    Retrieves the address information for a given latitude and longitude,
-    utilizing a cache to store and retrieve results.
+    Waits until the next Nominatim request may start.
+
+    Each call reserves the next free start time, at least
+    `NOMINATIM_MIN_INTERVAL` seconds after the previous one. Start times are
+    shared by all threads and event loops of the process, so concurrent
+    sessions together stay within the rate limit.
+    """
+    global nominatim_next_request_time
+    with nominatim_lock:
+        now = time.monotonic()
+        start = max(now, nominatim_next_request_time)
+        nominatim_next_request_time = start + NOMINATIM_MIN_INTERVAL
+    await asyncio.sleep(start - now)
+
+
+async def fetch_address_rate_limited(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    lat: float,
+    lon: float,
+) -> dict:
+    """
+    Fetches the address information for a given latitude and longitude using
+    the Nominatim API, respecting its rate limit.
+
+    `semaphore` bounds the requests in flight of the calling lookup, and
+    `wait_for_nominatim_slot` spaces requests process-wide.
 
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        semaphore (asyncio.Semaphore): The semaphore limiting concurrent
+            Nominatim requests.
         lat (float): The latitude coordinate.
         lon (float): The longitude coordinate.
 
     Returns:
         dict: The address information in JSON format.
     """
-    cache_key = f"{lat},{lon}"
-    cached_result = await cache.get(cache_key)
-    if cached_result:
-        return cached_result
+    async with semaphore:
+        await wait_for_nominatim_slot()
+        return await fetch_address(client, lat, lon)
 
-    address_data = await fetch_address(lat, lon)
-    address = address_data.get("address", {})
-    await cache.set(cache_key, address)
+
+def get_address_cache_key(lat: float, lon: float) -> tuple:
+    """
+    Builds the address cache key for a given latitude and longitude.
+
+    Coordinates are rounded to 5 decimals (about 1 meter), so nearby GPX
+    samples share an entry.
+
+    Args:
+        lat (float): The latitude coordinate.
+        lon (float): The longitude coordinate.
+
+    Returns:
+        tuple: The rounded latitude and longitude.
+    """
+    return round(lat, 5), round(lon, 5)
+
+
+def get_cached_road_address(lat: float, lon: float) -> dict | None:
+    """
+    Retrieves the address information for a given latitude and longitude from
+    the in-process cache.
+
+    Args:
+        lat (float): The latitude coordinate.
+        lon (float): The longitude coordinate.
+
+    Returns:
+        dict | None: The cached address information, or None if it is not
+            cached.
+    """
+    key = get_address_cache_key(lat, lon)
+    with address_cache_lock:
+        address = address_cache.get(key)
+        if address is not None:
+            address_cache.move_to_end(key)
+    return address
+
+
+async def get_road_address(
+    client: httpx.AsyncClient,
+    lat: float,
+    lon: float,
+    semaphore: asyncio.Semaphore | None = None,
+) -> dict:
+    """
+    Retrieves the address information for a given latitude and longitude,
+    utilizing an in-process cache and a persistent cache to store and
+    retrieve results.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        lat (float): The latitude coordinate.
+        lon (float): The longitude coordinate.
+        semaphore (asyncio.Semaphore, optional): If given, a cache miss is
+            fetched with `fetch_address_rate_limited` using this semaphore.
+
+    Returns:
+        dict: The address information in JSON format.
+    """
+    address = get_cached_road_address(lat, lon)
+    if address is not None:
+        return address
+
+    key = get_address_cache_key(lat, lon)
+    cache_key = f"address:{key[0]},{key[1]}"
+    address = await cache_get(cache_key)
+    # An empty address is a cached "Unable to geocode" result, not a miss.
+    if address is None:
+        if semaphore is None:
+            address_data = await fetch_address(client, lat, lon)
+        else:
+            address_data = await fetch_address_rate_limited(
+                client, semaphore, lat, lon
+            )
+        address = address_data.get("address", {})
+        await cache_set(cache_key, address)
+
+    with address_cache_lock:
+        address_cache[key] = address
+        if len(address_cache) > ADDRESS_CACHE_SIZE:
+            address_cache.popitem(last=False)
     return address
 
 
-async def get_multiple_road_addresses(coords: list) -> list:
+async def get_multiple_road_addresses(
+    client: httpx.AsyncClient, coords: list
+) -> list:
     """
     Retrieves address information for multiple sets of coordinates.
 
+    Addresses in the in-process cache are resolved directly, only the rest
+    are looked up concurrently. At most `NOMINATIM_CONCURRENCY` requests of
+    this call are in flight at a time; the limit is per call. Request starts
+    are spaced at least `NOMINATIM_MIN_INTERVAL` seconds apart across all
+    calls in the process.
+
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
         coords (list of tuple): A list of tuples where each tuple contains
             latitude and longitude as floats.
 
@@ -74,21 +206,30 @@ async def get_multiple_road_addresses(coords: list) -> list:
         list of dict: A list of dictionaries containing address information
             for each set of coordinates.
     """
-    tasks = [get_road_address(lat, lon) for lat, lon in coords]
-    results = await asyncio.gather(*tasks)
+    semaphore = asyncio.Semaphore(NOMINATIM_CONCURRENCY)
+    results = [get_cached_road_address(lat, lon) for lat, lon in coords]
+    missing_idx = [i for i, address in enumerate(results) if address is None]
+    tasks = [
+        get_road_address(client, *coords[i], semaphore=semaphore)
+        for i in missing_idx
+    ]
+    addresses = await asyncio.gather(*tasks)
+    for i, address in zip(missing_idx, addresses):
+        results[i] = address
     return results
 
 
 async def get_roads_and_prefecture_codes(
-    gpx_file_path: str, interval=400
+    client: httpx.AsyncClient, coordinates: np.ndarray, interval=400
 ) -> tuple:
     """
-    Extracts coordinates from a GPX file, samples points at regular intervals,
-    and retrieves road names/numbers and prefecture codes for each sampled
-    point.
+    Samples GPX route coordinates at regular intervals, and retrieves road
+    names/numbers and prefecture codes for each sampled point.
 
     Args:
-        gpx_file_path (str): The file path to the GPX file.
+        client (httpx.AsyncClient): The client to send requests with.
+        coordinates (np.ndarray): The GPX route coordinates of shape (N, 2),
+            as returned by `extract_coordinates_from_gpx`.
         interval (int, optional): The interval at which to sample points from
             the extracted coordinates. Defaults to 400.
 
@@ -97,28 +238,30 @@ async def get_roads_and_prefecture_codes(
             - unique_road_numbers (list): A list of unique road names/numbers.
             - prefecture_codes (list): A list of unique prefecture codes.
     """
-    # Extract coordinates from the GPX file
-    coordinates = extract_coordinates_from_gpx(gpx_file_path)
     # Sample points at regular intervals
     sampled_points = sample_points(coordinates, interval=interval)
 
     # Get road name/number for each sampled point
-    addresses = await get_multiple_road_addresses(sampled_points)
+    addresses = await get_multiple_road_addresses(
+        client, sampled_points.tolist()
+    )
 
-    # Remove duplicates and print the road numbers
-    unique_road_numbers = list(set(pydash.map_(addresses, ["road"])))
-    prefecture_codes = list(set(pydash.map_(addresses, ["ISO3166-2-lvl4"])))
-    unique_road_numbers = [
-        road_num for road_num in unique_road_numbers if road_num is not None
-    ]
-    return unique_road_numbers, prefecture_codes
+    # Collect unique road numbers and prefecture codes in a single pass
+    unique_road_numbers, prefecture_codes = set(), set()
+    for address in addresses:
+        unique_road_numbers.add(address.get("road"))
+        prefecture_codes.add(address.get("ISO3166-2-lvl4"))
+    unique_road_numbers.discard(None)
+    return list(unique_road_numbers), list(prefecture_codes)
 
 
-def get_osm_road_info(road_name: str) -> dict:
+async def get_osm_road_info(client: httpx.AsyncClient, road_name: str) -> dict:
     """
-    Retrieves OpenStreetMap (OSM) road information for a given road name.
+    Retrieves OpenStreetMap (OSM) road information for a given road name,
+    utilizing a persistent cache to store and retrieve results.
 
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
         road_name (str): The name of the road to query.
 
     Returns:
@@ -126,52 +269,88 @@ def get_osm_road_info(road_name: str) -> dict:
             number if available. If the road number is not available, the road
             name is returned as the value.
 
+    Raises:
+        httpx.HTTPStatusError: If the request fails with a status code other
+            than 200.
+
     Example:
-        >>> get_osm_road_info("Chuo Dori")
+        >>> await get_osm_road_info(client, "Chuo Dori")
         {'Chuo Dori': '123号'}
     """
+    cache_key = f"road:{road_name}"
+    cached_result = await cache_get(cache_key)
+    if cached_result:
+        return cached_result
+
     overpass_url = "https://overpass-api.de/api/interpreter"
+    # Only the ref tag is used, so project it out server-side instead of
+    # downloading every tag of every matching way.
     overpass_query = f"""
-    [out:json];
+    [out:json][timeout:30];
     way["name"="{road_name}"];
+    convert way ::id = id(), ref = t["ref"];
     out tags;
     """
-    client = httpx.Client(
-        base_url=overpass_url,
-        timeout=httpx.Timeout(timeout=180, connect=30, read=30, write=30),
-    )
-    response = client.get(overpass_url, params={"data": overpass_query})
-    data = response.json()
-    road_numbers = pydash.map_(data["elements"], "tags.ref")
+    response = await client.get(overpass_url, params={"data": overpass_query})
+    if response.status_code != 200:
+        raise httpx.HTTPStatusError(
+            f"Request failed with status code: {response.status_code}",
+            request=response.request,
+            response=response,
+        )
+    data = orjson.loads(response.content)
+    road_numbers = [
+        element.get("tags", {}).get("ref") for element in data["elements"]
+    ]
     if all(road_numbers):
         counter = Counter([r for r in road_numbers if r is not None])
         road_number, _ = counter.most_common(1)[0]
         road_info = {road_name: f"{road_number}号"}
     else:
         road_info = {road_name: road_name}
+    await cache_set(cache_key, road_info)
 
     return road_info
 
 
-def get_road_numbers(road_names: list) -> dict:
+async def get_road_numbers(
+    client: httpx.AsyncClient,
+    road_names: list,
+    concurrency: int = OVERPASS_CONCURRENCY,
+) -> dict:
     """
     Retrieves road numbers for a list of road names using OpenStreetMap (OSM)
     data.
 
+    The Overpass API is queried concurrently, with at most `concurrency`
+    requests in flight at a time.
+
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
         road_names (list): A list of road names as strings.
+        concurrency (int, optional): The maximum number of concurrent Overpass
+            requests. Defaults to `OVERPASS_CONCURRENCY`.
 
     Returns:
         dict: A dictionary where the keys are road names and the values are the
         corresponding road numbers. If a road number is not available, the road
         name is returned as the value.
 
+    Raises:
+        httpx.HTTPStatusError: If an Overpass request fails with a status code
+            other than 200.
+
     Example:
-        >>> get_road_numbers(["Chuo Dori", "Yasukuni Dori"])
+        >>> await get_road_numbers(client, ["Chuo Dori", "Yasukuni Dori"])
         {'Chuo Dori': '123号', 'Yasukuni Dori': 'Yasukuni Dori'}
     """
-    road_numbers = {}
-    for road in road_names:
-        road_info = get_osm_road_info(road)
-        road_numbers[road] = road_info[road]
-    return road_numbers
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get_road_number(road_name: str) -> tuple:
+        async with semaphore:
+            road_info = await get_osm_road_info(client, road_name)
+        return road_name, road_info[road_name]
+
+    tasks = [get_road_number(road) for road in road_names]
+    road_numbers = await asyncio.gather(*tasks)
+    return dict(road_numbers)
@@ -1,6 +1,12 @@
+from __future__ import annotations
+
+import asyncio
 from datetime import datetime
 
 import httpx
+import orjson
+
+from .utils import cache_get, cache_set
 
 TIME = datetime.now().strftime("%Y%M%d%H%M%S")
 URLS = {
@@ -15,13 +21,21 @@ URLS = {
     # Latest one
     "normal": f"https://www.jartic.or.jp/d/telop/normal.json?_={TIME}",
 }
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.124 Safari/537.36"
+}
+# Traffic info target changes every few minutes, cache it for 1 minute
+TARGET_CACHE_TTL = 60
 
 
-def get_map_data(url: str) -> dict:
+async def fetch_map_data(client: httpx.AsyncClient, url: str) -> dict:
     """
-    Fetches map data from the given URL.
+    Asynchronously fetches map data from the given URL.
 
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
         url (str): The URL to fetch the map data from.
 
     Returns:
@@ -31,17 +45,10 @@ def get_map_data(url: str) -> dict:
         httpx.HTTPStatusError: If the request fails with a status code other
         than 200.
     """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/91.0.4472.124 Safari/537.36"
-    }
-
-    with httpx.Client() as client:
-        response = client.get(url, headers=headers)
+    response = await client.get(url, headers=HEADERS)
 
     if response.status_code == 200:
-        return response.json()
+        return orjson.loads(response.content)
     else:
         raise httpx.HTTPStatusError(
             f"Request failed with status code: {response.status_code}",
@@ -50,13 +57,42 @@ def get_map_data(url: str) -> dict:
         )
 
 
-def get_road_status_by_prefecture_code(pref_code: str = "21") -> dict:
+async def get_traffic_info_target(client: httpx.AsyncClient) -> str:
+    """
+    Retrieves the current JARTIC traffic info target (data generation),
+    utilizing a cache to store and retrieve results.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+
+    Returns:
+        str: The current traffic info target, e.g. "202404252247".
+    """
+    cached_target = await cache_get("jartic_target")
+    if cached_target:
+        return cached_target
+
+    time = datetime.now().strftime("%Y%M%d%H%M%S")
+    target_url = (
+        f"https://www.jartic.or.jp/d/traffic_info/r1/target.json?_={time}"
+    )
+    target = (await fetch_map_data(client, target_url))["target"]
+    await cache_set("jartic_target", target, expire=TARGET_CACHE_TTL)
+    return target
+
+
+async def get_road_status_by_prefecture_code_async(
+    client: httpx.AsyncClient, pref_code: str = "21", target: str | None = None
+) -> dict:
     """
-    Retrieves road status data for a given prefecture code.
+    Asynchronously retrieves road status data for a given prefecture code.
 
     Args:
+        client (httpx.AsyncClient): The client to send requests with.
         pref_code (str): The prefecture code to fetch the road status for.
             Defaults to "21".
+        target (str, optional): The traffic info target to fetch the data
+            for. The current target is retrieved if not provided.
 
     Returns:
         dict: The road status data for the specified prefecture code.
@@ -65,14 +101,37 @@ def get_road_status_by_prefecture_code(pref_code: str = "21") -> dict:
         httpx.HTTPStatusError: If the request fails with a status code other
             than 200.
     """
-    time = datetime.now().strftime("%Y%M%d%H%M%S")
-    target_url = (
-        f"https://www.jartic.or.jp/d/traffic_info/r1/target.json?_={time}"
-    )
-    target = get_map_data(target_url)["target"]
-    data = get_map_data(
+    if target is None:
+        target = await get_traffic_info_target(client)
+    data = await fetch_map_data(
+        client,
         f"https://www.jartic.or.jp/d/traffic_info/r1/{target}/d/301/"
-        f"R{pref_code}.json"
+        f"R{pref_code}.json",
     )
 
     return data
+
+
+async def get_road_status_by_prefecture_codes(
+    client: httpx.AsyncClient, pref_codes: list
+) -> list:
+    """
+    Concurrently retrieves road status data for multiple prefecture codes.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        pref_codes (list): A list of prefecture codes as strings.
+
+    Returns:
+        list: A list of road status data, one for each prefecture code.
+
+    Raises:
+        httpx.HTTPStatusError: If a request fails with a status code other
+            than 200.
+    """
+    target = await get_traffic_info_target(client)
+    tasks = [
+        get_road_status_by_prefecture_code_async(client, pref_code, target)
+        for pref_code in pref_codes
+    ]
+    return await asyncio.gather(*tasks)
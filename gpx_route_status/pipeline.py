@@ -6,10 +6,10 @@ from .get_roads_from_gpx_file import (
     get_road_numbers,
     get_roads_and_prefecture_codes,
 )
-from .get_traffic_status import get_road_status_by_prefecture_code
+from .get_traffic_status import get_road_status_by_prefecture_codes
 from .plot_route import plot_route_with_closed_sections
-from .postprocessing import filter_closed_roads, filter_traffic_status_by_road
-from .utils import logfire
+from .postprocessing import filter_closed_roads, filter_traffic_status_by_roads
+from .utils import create_async_client, extract_coordinates_from_gpx, logfire
 
 
 async def get_closed_roads(
@@ -40,32 +40,34 @@ async def get_closed_roads(
         "Getting roads information using OpenStreetMap Data!!", icon="ℹ️"
     )
     logfire.info("Getting roads information using OpenStreetMap Data!!")
-    roads, prefs = await get_roads_and_prefecture_codes(
-        gpx_file_path, gpx_points_interval
-    )
-    logfire.info(f"List of roads: {str(roads)}")
-    logfire.info(f"List of prefectures: {str(prefs)}")
-    message_placeholder.info(
-        "Getting roads numbers using Overpass API!!", icon="ℹ️"
-    )
-    logfire.info("Getting roads numbers using Overpass API!!")
-    road_numbers = get_road_numbers(road_names=roads)
-    message_placeholder.info(
-        "Getting traffic data from https://www.jartic.or.jp/!", icon="ℹ️"
-    )
-    logfire.info("Getting traffic data from https://www.jartic.or.jp/!")
-    traffic_data = []
-    for pref_code in prefs:
-        pref_code = pref_code.replace("JP-", "")
-        data = get_road_status_by_prefecture_code(pref_code)
-        traffic_data.append(data)
+    # Parse the GPX file once and share the coordinates with all steps.
+    coordinates = extract_coordinates_from_gpx(gpx_file_path)
+    async with create_async_client() as client:
+        roads, prefs = await get_roads_and_prefecture_codes(
+            client, coordinates, gpx_points_interval
+        )
+        logfire.info(f"List of roads: {str(roads)}")
+        logfire.info(f"List of prefectures: {str(prefs)}")
+        message_placeholder.info(
+            "Getting roads numbers using Overpass API!!", icon="ℹ️"
+        )
+        logfire.info("Getting roads numbers using Overpass API!!")
+        road_numbers = await get_road_numbers(client, road_names=roads)
+        message_placeholder.info(
+            "Getting traffic data from https://www.jartic.or.jp/!", icon="ℹ️"
+        )
+        logfire.info("Getting traffic data from https://www.jartic.or.jp/!")
+        pref_codes = [pref_code.replace("JP-", "") for pref_code in prefs]
+        traffic_data = await get_road_status_by_prefecture_codes(
+            client, pref_codes
+        )
     message_placeholder.info("Filtering restricted roads!!", icon="ℹ️")
     logfire.info("Filtering restricted roads!!")
+    road_numbers_set = set(road_numbers.values())
     closed_roads = []
-    for _, v in road_numbers.items():
-        for data in traffic_data:
-            filter_data = filter_traffic_status_by_road(v, data)
-            closed_roads.extend(filter_data)
+    for data in traffic_data:
+        filter_data = filter_traffic_status_by_roads(road_numbers_set, data)
+        closed_roads.extend(filter_data)
     all_affected_roads, complete_closed_roads = filter_closed_roads(
         closed_roads
     )
@@ -76,7 +78,7 @@ async def get_closed_roads(
         "Preparing Map of route and affect roads!", icon="ℹ️"
     )
     logfire.info("Preparing Map of route and affect roads!")
-    fig = plot_route_with_closed_sections(gpx_file_path, closed_road_points)
+    fig = plot_route_with_closed_sections(coordinates, closed_road_points)
     message_placeholder.empty()
     return all_affected_roads, fig
 
@@ -100,14 +102,10 @@ def run_gpx_route_pipeline(
             - fig (plotly.graph_objs._figure.Figure): A Plotly figure object
               with the route and closed sections plotted.
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    closed_roads, fig = loop.run_until_complete(
-        (
-            get_closed_roads(
-                gpx_file_path=gpx_file_path,
-                gpx_points_interval=gpx_points_interval,
-            )
+    closed_roads, fig = asyncio.run(
+        get_closed_roads(
+            gpx_file_path=gpx_file_path,
+            gpx_points_interval=gpx_points_interval,
         )
     )
 
@@ -1,26 +1,96 @@
+from collections.abc import Callable
+
 import numpy as np
 import plotly.graph_objects as go
 from decouple import config
-from geopy.distance import geodesic
 
-from .utils import extract_coordinates_from_gpx
+from .utils import EARTH_RADIUS_M, equirectangular_distance
 
 MAPBOX_SECRET = config("MAPBOX_SECRET")
 MAPBOX_STYLE = config("MAPBOX_STYLE")
+# Length of one degree of latitude in meters.
+METERS_PER_DEGREE = EARTH_RADIUS_M * np.pi / 180
+# Multiplier to combine grid row and column into a single cell key.
+GRID_KEY_STRIDE = 2**32
+# Row and column offsets of a grid cell and its 8 neighbours.
+NEIGHBOUR_OFFSETS = np.array([(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1)])
+
+
+def get_grid_cell_keys(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    Combine grid row and column numbers into integer cell keys.
+
+    Args:
+        rows (np.ndarray): Grid row numbers.
+        cols (np.ndarray): Grid column numbers.
+
+    Returns:
+        np.ndarray: Integer cell keys.
+    """
+    return rows.astype(np.int64) * GRID_KEY_STRIDE + cols.astype(np.int64)
+
+
+def build_route_index(
+    latitudes: np.ndarray, longitudes: np.ndarray, radius: float
+) -> Callable[[float, float], np.ndarray]:
+    """
+    Build a grid index of route points for radius lookups.
+
+    Route points are binned into grid cells at least `radius` meters wide and
+    sorted by cell once. A lookup then only measures the distance to points
+    in the 3x3 cells around the query point instead of the whole route.
+
+    Args:
+        latitudes (np.ndarray): Latitudes of the route points.
+        longitudes (np.ndarray): Longitudes of the route points.
+        radius (float): The lookup radius in meters.
+
+    Returns:
+        Callable[[float, float], np.ndarray]: A function taking a latitude and
+            longitude and returning the sorted indices of the route points
+            within `radius` meters of it.
+    """
+    lat_step = radius / METERS_PER_DEGREE
+    # Longitude degrees shrink towards the poles, size cells for the highest
+    # latitude around the route so they are never narrower than the radius.
+    max_lat = min(np.abs(latitudes).max() + lat_step, 89.0)
+    lon_step = lat_step / np.cos(np.radians(max_lat))
+    keys = get_grid_cell_keys(
+        np.floor(latitudes / lat_step), np.floor(longitudes / lon_step)
+    )
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    def find_points_within(lat: float, lon: float) -> np.ndarray:
+        neighbour_keys = get_grid_cell_keys(
+            np.floor(lat / lat_step) + NEIGHBOUR_OFFSETS[:, 0],
+            np.floor(lon / lon_step) + NEIGHBOUR_OFFSETS[:, 1],
+        )
+        lows = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        highs = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+        candidates = np.concatenate(
+            [order[low:high] for low, high in zip(lows, highs)]
+        )
+        distances = equirectangular_distance(
+            latitudes[candidates], longitudes[candidates], lat, lon
+        )
+        return np.sort(candidates[distances < radius])
+
+    return find_points_within
 
 
 def plot_route_with_closed_sections(
-    gpx_file_path: str, closed_sections: list, distance_threshold: float = 60
+    coords: np.ndarray, closed_sections: list, distance_threshold: float = 60
 ) -> go.Figure:
     """
     Plots a GPX route with closed sections highlighted.
 
-    This function reads a GPX file to extract the route coordinates and plots
-    the route on a map using Plotly. It also highlights the closed sections of
-    the route in red.
+    This function plots the GPX route coordinates on a map using Plotly. It
+    also highlights the closed sections of the route in red.
 
     Args:
-        gpx_file_path (str): The file path to the GPX file.
+        coords (np.ndarray): The GPX route coordinates of shape (N, 2), as
+            returned by `extract_coordinates_from_gpx`.
         closed_sections (list): A list of tuples, where each tuple contains the
             start and end coordinates (latitude, longitude) of a closed section.
         distance_threshold (float): The distance threshold (in meter) to check
@@ -30,14 +100,14 @@ def plot_route_with_closed_sections(
         go.Figure: A Plotly figure object with the route and closed sections
             plotted.
     """
-    coords = extract_coordinates_from_gpx(gpx_file_path)
-    latitudes, longitudes = zip(*coords)
+    # Contiguous latitude and longitude columns for the vectorized lookups.
+    latitudes, longitudes = np.ascontiguousarray(coords.T)
 
     # Create the main route plot
     fig = go.Figure(
         go.Scattermapbox(
-            lat=latitudes,
-            lon=longitudes,
+            lat=latitudes.tolist(),
+            lon=longitudes.tolist(),
             mode="lines",
             line=dict(color="blue", width=3),
             name="Route",
@@ -49,40 +119,41 @@ def plot_route_with_closed_sections(
     closed_sections = [
         section for section in closed_sections if len(section) == 2
     ]
+    find_points_within = build_route_index(
+        latitudes, longitudes, distance_threshold
+    )
+    closed_latitudes, closed_longitudes = [], []
     for start, end in closed_sections:
-        closed_latitudes = []
-        closed_longitudes = []
-        start_found = False
-        end_found = False
-        for lat, lon in coords:
-            if not start_found:
-                if (
-                    geodesic(start[::-1], (lat, lon)).meters
-                    < distance_threshold
-                ):  # Correct order: (latitude, longitude)
-                    start_found = True
-                if geodesic(end[::-1], (lat, lon)).meters < distance_threshold:
-                    start_found = True
-                    end = start
-            if start_found:
-                closed_latitudes.append(lat)
-                closed_longitudes.append(lon)
-                if (
-                    geodesic(end[::-1], (lat, lon)).meters < distance_threshold
-                ):  # Correct order: (latitude, longitude)
-                    end_found = True
-                    break
+        # Section points are (longitude, latitude).
+        near_start = find_points_within(start[1], start[0])
+        near_end = find_points_within(end[1], end[0])
+        hits = np.union1d(near_start, near_end)
+        if hits.size == 0:
+            continue
+        first = hits[0]
+        # If the route reaches the end point first, it runs through the
+        # section backwards and the section closes at the start point.
+        near_stop = near_start if first in near_end else near_end
+        stops = near_stop[near_stop >= first]
         # Only add closed road data is start and end both found.
-        if start_found is True and end_found is True:
-            fig.add_trace(
-                go.Scattermapbox(
-                    lat=closed_latitudes,
-                    lon=closed_longitudes,
-                    mode="lines",
-                    line=dict(color="red", width=5),
-                    name="Closed Road",
-                )
+        if stops.size == 0:
+            continue
+        last = stops[0]
+        # Sections are drawn as one trace, separated by None gaps.
+        closed_latitudes += latitudes[first : last + 1].tolist() + [None]
+        closed_longitudes += longitudes[first : last + 1].tolist() + [None]
+
+    if closed_latitudes:
+        fig.add_trace(
+            go.Scattermapbox(
+                lat=closed_latitudes,
+                lon=closed_longitudes,
+                mode="lines",
+                line=dict(color="red", width=5),
+                name="Closed Road",
+                connectgaps=False,
             )
+        )
 
     fig.update_layout(
         mapbox_style=MAPBOX_STYLE,
@@ -1,12 +1,62 @@
+from __future__ import annotations
+
 import re
+from functools import lru_cache
 from unicodedata import normalize
 
+import numpy as np
 import pandas as pd
-import pydash
 
 from .utils import logfire
 
+ROAD_NUMBER_PATTERN = re.compile(r"\d+号")
+# JARTIC traffic properties to keep and their column names. Other properties
+# (cs, l, lo, pd, rn, j) are not useful for the report and are dropped.
+CLOSED_ROAD_COLUMNS = {
+    "c": "work_type",
+    "d": "direction",
+    "i": "location_description",
+    "p": "coordinates",
+    "r": "route_name",
+    "rd": "restriction_description",
+}
+# Extractors of the (longitude, latitude) points of supported closed road
+# geometries. Only the first line of a MultiLineString is used.
+GEOMETRY_EXTRACTORS = {
+    "LineString": lambda coord: np.asarray(coord, dtype=np.float64),
+    "MultiLineString": lambda coord: np.asarray(coord[0], dtype=np.float64),
+}
+
+
+def get_trailing_road_number(road_name: str) -> str | None:
+    """
+    Extract the road number from road names like "国道1号" without regex.
+
+    Most JARTIC road names end with their only road number written in ASCII
+    digits. For those names the number is found by scanning back from the
+    final '号'.
 
+    Args:
+        road_name (str): The name of the road.
+
+    Returns:
+        str | None: The road number, or None if the name has another shape
+            and needs to go through `ROAD_NUMBER_PATTERN`.
+    """
+    if not road_name.endswith("号") or road_name.count("号") != 1:
+        return None
+    start = len(road_name) - 1
+    while start > 0 and "0" <= road_name[start - 1] <= "9":
+        start -= 1
+    if start == len(road_name) - 1:
+        return None
+    # A preceding fullwidth or other Unicode digit belongs to the number.
+    if start > 0 and normalize("NFKC", road_name[start - 1])[-1].isdecimal():
+        return None
+    return road_name[start:]
+
+
+@lru_cache(maxsize=8192)
 def clean_road_names(road_name: str) -> str:
     """
     Clean and normalize the road name.
@@ -14,7 +64,8 @@ def clean_road_names(road_name: str) -> str:
     This function normalizes the input road name using Unicode Normalization
     Form KC (NFKC) and extracts the road number if it matches the pattern of
     digits followed by the character '号'. If no such pattern is found, the
-    original road name is returned.
+    original road name is returned. Results are cached, as traffic data
+    repeats the same road names across many features.
 
     Args:
         road_name (str): The name of the road to be cleaned.
@@ -22,30 +73,46 @@ def clean_road_names(road_name: str) -> str:
     Returns:
         str: The cleaned road name, which is either the extracted road number or the original road name.
     """
-    road_name = normalize("NFKC", road_name)
-    match = re.search("\\d+号", road_name)
+    road_number = get_trailing_road_number(road_name)
+    if road_number is not None:
+        return road_number
+    # ASCII strings are already in NFKC form.
+    if not road_name.isascii():
+        road_name = normalize("NFKC", road_name)
+    match = ROAD_NUMBER_PATTERN.search(road_name)
     if match:
         return match.group()
     return road_name
 
 
-def filter_traffic_status_by_road(road_number: str, traffic_data: dict) -> list:
+def filter_traffic_status_by_roads(
+    road_numbers: set, traffic_data: dict
+) -> list:
     """
-    Filter traffic status data by a specific road number.
+    Filter traffic status data by a set of road numbers.
 
     Args:
-        road_number (str): The road number to filter the traffic data.
+        road_numbers (set): The road numbers to filter the traffic data.
         traffic_data (dict): The traffic data containing road features.
 
     Returns:
-        list: Filtered traffic data for the specified road number.
+        list: Filtered traffic data for the specified road numbers.
     """
-    road_names_traffic = pydash.map_(traffic_data["features"], "properties.r")
-    road_names_traffic = [clean_road_names(r) for r in road_names_traffic]
-    matched_road_idx = [
-        i for i, v in enumerate(road_names_traffic) if road_number == v
-    ]
-    road_traffic_data = [traffic_data["features"][i] for i in matched_road_idx]
+    features = traffic_data["features"]
+    road_names = pd.Series(
+        [feature["properties"].get("r") for feature in features], dtype=object
+    )
+    # Clean and match each distinct road name once, then map the result back
+    # to all features through the factorized codes.
+    codes, unique_road_names = road_names.factorize()
+    is_matched = np.array(
+        [clean_road_names(name) in road_numbers for name in unique_road_names]
+        # Missing road names get code -1, which picks this trailing False.
+        + [False],
+        dtype=bool,
+    )
+    matched_road_idx = np.flatnonzero(is_matched[codes])
+    road_traffic_data = [features[i] for i in matched_road_idx]
 
     return road_traffic_data
 
@@ -58,21 +125,22 @@ def get_closed_road_geometry(closed_roads: dict) -> tuple:
         closed_roads (dict): Traffic data of restricted/closed roads.
 
     Returns:
-        tuple: Tuple of list of latitudes and longitudes.
+        tuple: Tuple of list of latitudes and longitudes arrays, one for each
+            road with a non-empty LineString or MultiLineString geometry.
 
     """
-    types = pydash.map_(closed_roads, "geometry.type")
-    coords = pydash.map_(closed_roads, "geometry.coordinates")
     lat_coordinates = []
     lon_coordinates = []
-    for geo_type, coord in zip(types, coords):
-        lons, lats = [], []
-        if geo_type == "MultiLineString":
-            lons, lats = zip(*coord[0])
-        elif geo_type == "LineString":
-            lons, lats = zip(*coord)
-        lat_coordinates.append(lats)
-        lon_coordinates.append(lons)
+    for closed_road in closed_roads:
+        geometry = closed_road["geometry"]
+        extract_points = GEOMETRY_EXTRACTORS.get(geometry["type"])
+        if extract_points is None:
+            continue
+        points = extract_points(geometry["coordinates"])
+        if points.size == 0:
+            continue
+        lat_coordinates.append(points[:, 1])
+        lon_coordinates.append(points[:, 0])
     return lat_coordinates, lon_coordinates
 
 
@@ -87,34 +155,32 @@ def filter_closed_roads(closed_roads: list):
     Returns:
         tuple: A tuple containing two pandas DataFrames:
             - The first DataFrame contains the processed closed roads data with
-             unnecessary columns removed and remaining columns renamed.
+             only the `CLOSED_ROAD_COLUMNS` properties, renamed.
             - The second DataFrame is a subset of the first DataFrame,
             containing only rows where the restriction description indicates a
             complete road closure.
     """
-    df = pd.DataFrame(pydash.map_(closed_roads, "properties"))
-    columns = df.columns
-    useless_cols = ["cs", "l", "lo", "pd", "rn", "j"]
-    remove_cols = [col for col in useless_cols if col in columns]
-    df.drop(columns=remove_cols, axis=1, inplace=True)
-    column_mapping = {
-        "c": "work_type",
-        "d": "direction",
-        "i": "location_description",
-        "p": "coordinates",
-        "r": "route_name",
-        "cs": "cs",
-        "l": "lane_type",
-        "lo": "lane_occupancy",
-        "pd": "road_type",
-        "rd": "restriction_description",
-        "rn": "restriction_id",
-        "j": "additional_info",
-    }
-    df.rename(columns=column_mapping, inplace=True)
-    if "restriction_description" in df.columns:
-        df = df[df["restriction_description"].notnull()]
-        complete_closed_roads = df[df["restriction_description"] == "通行止"]
-        logfire.info(f"Number of closed roads: {len(complete_closed_roads)}.")
-        return df, complete_closed_roads
-    return pd.DataFrame(), pd.DataFrame()
+    properties = [closed_road["properties"] for closed_road in closed_roads]
+    df = pd.DataFrame(
+        {
+            column: [prop.get(key) for prop in properties]
+            for key, column in CLOSED_ROAD_COLUMNS.items()
+        }
+    )
+    # Few distinct restrictions repeat over many roads, store them as
+    # categories so the closure check compares integer codes.
+    df["restriction_description"] = df["restriction_description"].astype(
+        "category"
+    )
+    df = df[df["restriction_description"].notnull()]
+    restrictions = df["restriction_description"]
+    categories = restrictions.cat.categories
+    if "通行止" in categories:
+        is_closed = restrictions.cat.codes.to_numpy() == categories.get_loc(
+            "通行止"
+        )
+    else:
+        is_closed = np.zeros(len(df), dtype=bool)
+    complete_closed_roads = df[is_closed]
+    logfire.info(f"Number of closed roads: {len(complete_closed_roads)}.")
+    return df, complete_closed_roads
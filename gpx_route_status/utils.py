@@ -1,64 +1,301 @@
 from __future__ import annotations
 
-import gpxpy
+import asyncio
+import atexit
+import copy
+from array import array
+from functools import lru_cache
+from typing import Any
+from xml.etree import ElementTree
+
+import diskcache
 import httpx
 import logfire
+import numpy as np
+import orjson
 import streamlit as st
 from decouple import config
-from geopy.distance import geodesic
 
-LOGFIRE_TOKEN = config("LOGFIRE_TOKEN")
-logfire.configure(token=LOGFIRE_TOKEN)
+EARTH_RADIUS_M = 6371000
+
+# Persistent cache for API results, it survives Streamlit reruns and is shared
+# between processes. Entries expire after 24 hour.
+CACHE_DIR = config("CACHE_DIR", default="/tmp/gpx_route_status_cache")
+CACHE_TTL = 3600 * 24
+disk_cache = diskcache.Cache(CACHE_DIR)
+
+OSRM_URL = "https://router.project-osrm.org"
+# The public OSRM demo server has a usage limit, raise it for a self-hosted
+# instance.
+OSRM_CONCURRENCY = config("OSRM_CONCURRENCY", cast=int, default=1)
+
+
+@st.cache_resource
+def configure_logfire():
+    """
+    Configures logfire with the `LOGFIRE_TOKEN` setting.
+
+    The configuration is cached as a Streamlit resource, so it runs once per
+    server process instead of on every rerun.
+
+    Returns:
+        module: The configured logfire module.
+    """
+    logfire.configure(token=config("LOGFIRE_TOKEN"))
+    return logfire
+
+
+@lru_cache(maxsize=1)
+def get_osrm_client() -> httpx.Client:
+    """
+    Returns the shared OSRM client.
+
+    The client is created on first use, so importing this module doesn't
+    open a connection pool. Connections are then reused across route
+    requests, and the client is closed at exit.
+
+    Returns:
+        httpx.Client: The OSRM HTTP client.
+    """
+    client = httpx.Client(base_url=OSRM_URL, http2=True, timeout=10.0)
+    atexit.register(client.close)
+    return client
+
+
+def create_async_client() -> httpx.AsyncClient:
+    """
+    Creates a client for async API calls.
+
+    Requests are multiplexed over HTTP/2 connections and retried up to 3
+    times on connection errors. The connection pool is bound to the event
+    loop it is used in, so create a client per pipeline run and close it
+    when the run is done.
+
+    Returns:
+        httpx.AsyncClient: The async HTTP client.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout=180, connect=30, read=30, write=30),
+        transport=transport,
+    )
+
+
+async def cache_get(key: str) -> Any:
+    """
+    Retrieves a value from the persistent cache without blocking the event
+    loop.
+
+    Args:
+        key (str): The cache key.
+
+    Returns:
+        Any: The cached value, or None if the key is not cached or expired.
+    """
+    return await asyncio.to_thread(disk_cache.get, key)
+
+
+async def cache_set(key: str, value: Any, expire: float = CACHE_TTL) -> None:
+    """
+    Stores a value in the persistent cache without blocking the event loop.
+
+    Args:
+        key (str): The cache key.
+        value (Any): The value to cache, it must be picklable.
+        expire (float, optional): Seconds until the entry expires. Defaults
+            to `CACHE_TTL`.
+    """
+    await asyncio.to_thread(disk_cache.set, key, value, expire=expire)
 
 
 # Function to read GPX file and extract coordinates
+@st.cache_data(
+    hash_funcs={
+        st.runtime.uploaded_file_manager.UploadedFile: lambda f: f.getvalue()
+    }
+)
 def extract_coordinates_from_gpx(
     file_path: str | st.runtime.uploaded_file_manager.UploadedFile,
-) -> list:
+) -> np.ndarray:
     """
     Extracts coordinates from a GPX file.
 
-    This function parses a GPX file and extracts the latitude and longitude
-    coordinates from it. The input can be either a file path or a Streamlit
+    This function stream-parses a GPX file and extracts the latitude and
+    longitude of every track point. Parsed points are cleared and detached
+    from the tree as soon as they are read, so memory use does not grow with
+    the XML tree. The input can be either a file path or a Streamlit
     UploadedFile object.
 
+    Results are cached by Streamlit, keyed on the file path or the content of
+    the uploaded file, so reruns with the same file skip parsing.
+
     Args:
         file_path (str or st.runtime.uploaded_file_manager.UploadedFile):
             The path to the GPX file or a Streamlit UploadedFile object.
 
     Returns:
-        list: A list of tuples where each tuple contains the latitude
-        and longitude of a point in the GPX file.
+        np.ndarray: A float64 array of shape (N, 2) where each row contains
+        the latitude and longitude of a point in the GPX file.
     """
     if isinstance(file_path, st.runtime.uploaded_file_manager.UploadedFile):
-        gpx = gpxpy.parse(file_path.getvalue())
-    else:
-        with open(file_path, "r") as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-
-    coordinates = []
-    for track in gpx.tracks:
-        for segment in track.segments:
-            for point in segment.points:
-                coordinates.append((point.latitude, point.longitude))
+        file_path.seek(0)
+
+    # Flat buffer of latitude, longitude pairs, no per-point Python tuples.
+    buffer = array("d")
+    segment = None
+    for event, element in ElementTree.iterparse(
+        file_path, events=("start", "end")
+    ):
+        # Match on local name to support both GPX 1.0 and 1.1 namespaces.
+        tag = element.tag.rpartition("}")[2]
+        if event == "start":
+            if tag == "trkseg":
+                segment = element
+        elif tag == "trkpt":
+            buffer.append(float(element.get("lat")))
+            buffer.append(float(element.get("lon")))
+            element.clear()
+            # Detach the parsed point so segments don't keep empty elements.
+            if segment is not None:
+                segment.remove(element)
+    coordinates = np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)
     logfire.info(f"Number of points is {len(coordinates)}.")
     return coordinates
 
 
 # Function to sample points at regular intervals
-def sample_points(coordinates: list, interval=400) -> list:
+def sample_points(
+    coordinates: np.ndarray, interval=400, interval_m: float | None = None
+) -> np.ndarray:
     """
-    Samples points from a list of coordinates at a specified interval.
+    Samples points from an array of coordinates at a specified interval.
+
+    By default every `interval`-th point is sampled. As GPX recording rates
+    vary between devices, `interval_m` can be given instead to sample points
+    at regular distances along the route.
 
     Args:
-        coordinates (list): A list of coordinate points.
+        coordinates (np.ndarray): An array of coordinate points of shape
+            (N, 2).
         interval (int, optional): The interval at which to sample points.
             Defaults to 400.
+        interval_m (float, optional): The distance (in meter) along the route
+            at which to sample points. Overrides `interval` when given.
+
+    Returns:
+        np.ndarray: The sampled coordinate points.
+
+    Raises:
+        ValueError: If `interval_m` is not positive.
+    """
+    if interval_m is None or len(coordinates) < 2:
+        return coordinates[::interval]
+    if interval_m <= 0:
+        raise ValueError(f"interval_m must be positive, got {interval_m}.")
+
+    latitudes, longitudes = coordinates[:, 0], coordinates[:, 1]
+    segment_lengths = haversine_distance(
+        latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]
+    )
+    distances = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+    # The first point is always sampled, even for a route of zero length.
+    targets = np.arange(0, max(distances[-1], interval_m), interval_m)
+    # Targets closer than the point spacing map to the same point, keep it
+    # once.
+    return coordinates[np.unique(np.searchsorted(distances, targets))]
+
+
+def get_osrm_route_path(
+    lat1: float, lon1: float, lat2: float, lon2: float, return_geometry=False
+) -> str:
+    """
+    Formats the OSRM API path of a bike route request between two points.
+
+    The route geometry is only requested if needed, as it makes up most of
+    the response for long routes.
+
+    Args:
+        lat1 (float): Latitude of the starting point.
+        lon1 (float): Longitude of the starting point.
+        lat2 (float): Latitude of the destination point.
+        lon2 (float): Longitude of the destination point.
+        return_geometry (bool, optional): If True, requests the full route
+            geometry in GeoJSON format. Defaults to False.
+
+    Returns:
+        str: The request path, relative to `OSRM_URL`.
+    """
+    overview = "full&geometries=geojson" if return_geometry else "false"
+    return f"/route/v1/bike/{lon1},{lat1};{lon2},{lat2}?overview={overview}"
+
+
+def get_osrm_cache_key(
+    lat1: float, lon1: float, lat2: float, lon2: float, return_geometry: bool
+) -> str:
+    """
+    Builds the persistent cache key of an OSRM route.
+
+    Args:
+        lat1 (float): Latitude of the starting point, rounded to 5 decimals.
+        lon1 (float): Longitude of the starting point, rounded to 5 decimals.
+        lat2 (float): Latitude of the destination point, rounded to 5
+            decimals.
+        lon2 (float): Longitude of the destination point, rounded to 5
+            decimals.
+        return_geometry (bool): Whether the route geometry is returned.
 
     Returns:
-        list: A list of sampled coordinate points.
+        str: The cache key.
     """
-    return coordinates[::interval]
+    return f"osrm:{lat1},{lon1};{lat2},{lon2}:{return_geometry}"
+
+
+def decode_osrm_response(response: httpx.Response) -> dict:
+    """
+    Decodes an OSRM API response.
+
+    Args:
+        response (httpx.Response): The OSRM route response.
+
+    Returns:
+        dict: The decoded route response.
+
+    Raises:
+        httpx.HTTPStatusError: If the request failed with a status code other
+            than 200.
+    """
+    if response.status_code != 200:
+        raise httpx.HTTPStatusError(
+            f"Request failed with status code: {response.status_code}",
+            request=response.request,
+            response=response,
+        )
+    return orjson.loads(response.content)
+
+
+def parse_osrm_route(data: dict, return_geometry=False) -> tuple | float:
+    """
+    Extracts the distance and geometry of the first route in an OSRM API
+    response.
+
+    Args:
+        data (dict): The OSRM route response.
+        return_geometry (bool, optional): If True, returns the route
+            geometry in GeoJSON format. Defaults to False.
+
+    Returns:
+        tuple | float: The distance in kilometers, and the route geometry if
+            `return_geometry` is True.
+    """
+    route = data["routes"][0]
+    distance = route["distance"] / 1000  # in kilometers
+    if return_geometry:
+        return distance, route["geometry"]  # GeoJSON format
+    return distance
 
 
 def get_shortest_path_osrm(
@@ -66,7 +303,7 @@ def get_shortest_path_osrm(
 ) -> tuple | float:
     """
     Retrieves the shortest path between two geographical points using the
-    OSRM API.
+    OSRM API. Results are cached, keyed on coordinates rounded to 5 decimals.
 
     Args:
         lat1 (float): Latitude of the starting point.
@@ -83,24 +320,105 @@ def get_shortest_path_osrm(
             If `return_geometry` is False, returns only the distance in
             kilometers.
     """
-    client = httpx.Client(base_url="https://router.project-osrm.org")
-    # Format the URL for the route request
-    url = (
-        f"/route/v1/bike/{lon1},{lat1};{lon2},{lat2}?overview=full&"
-        f"geometries=geojson"
+    # Round to about 1 meter, so nearby requests share a cache entry.
+    result = get_cached_shortest_path_osrm(
+        round(lat1, 5),
+        round(lon1, 5),
+        round(lat2, 5),
+        round(lon2, 5),
+        return_geometry,
     )
+    if return_geometry:
+        # The cached geometry is shared, hand out a copy callers can modify.
+        distance, geometry = result
+        return distance, copy.deepcopy(geometry)
+    return result
 
-    # Send the request to OSRM
-    response = client.get(url)
-    data = response.json()
 
-    # Extract route information
-    route = data["routes"][0]
-    distance = route["distance"] / 1000  # in kilometers
-    geometry = route["geometry"]  # GeoJSON format
-    if return_geometry:
-        return distance, geometry
-    return distance
+@lru_cache(maxsize=65536)
+def get_cached_shortest_path_osrm(
+    lat1: float, lon1: float, lat2: float, lon2: float, return_geometry: bool
+) -> tuple | float:
+    """
+    Retrieves the shortest path between two geographical points using the
+    OSRM API, utilizing an in-process cache and a persistent cache to store
+    and retrieve results.
+
+    The in-process cache ignores `CACHE_TTL`, its entries live until they
+    are evicted or the process exits. It returns the same geometry object
+    on every hit, so use `get_shortest_path_osrm`, which copies it.
+
+    Args:
+        lat1 (float): Latitude of the starting point.
+        lon1 (float): Longitude of the starting point.
+        lat2 (float): Latitude of the destination point.
+        lon2 (float): Longitude of the destination point.
+        return_geometry (bool): If True, returns the route geometry in
+            GeoJSON format.
+
+    Returns:
+        tuple | float: The result of `get_shortest_path_osrm`.
+    """
+    cache_key = get_osrm_cache_key(lat1, lon1, lat2, lon2, return_geometry)
+    result = disk_cache.get(cache_key)
+    if result is None:
+        # Send the request to OSRM
+        response = get_osrm_client().get(
+            get_osrm_route_path(lat1, lon1, lat2, lon2, return_geometry)
+        )
+        result = parse_osrm_route(
+            decode_osrm_response(response), return_geometry
+        )
+        disk_cache.set(cache_key, result, expire=CACHE_TTL)
+    return result
+
+
+async def get_shortest_paths_osrm(
+    client: httpx.AsyncClient, points_pairs: list, return_geometry=False
+) -> list:
+    """
+    Concurrently retrieves the shortest paths between multiple pairs of
+    geographical points using the OSRM API.
+
+    This is a library entry point for bulk route lookups, the Streamlit
+    pipeline does not use OSRM. Results share the persistent cache of
+    `get_shortest_path_osrm`, and at most `OSRM_CONCURRENCY` requests are sent
+    to OSRM at a time.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        points_pairs (list): A list of (lat1, lon1, lat2, lon2) tuples with
+            the starting and destination point of each route.
+        return_geometry (bool, optional): If True, returns the route
+            geometries in GeoJSON format. Defaults to False.
+
+    Returns:
+        list: The result of `get_shortest_path_osrm` for each pair of points.
+
+    Raises:
+        httpx.HTTPStatusError: If a request fails with a status code other
+            than 200.
+    """
+    semaphore = asyncio.Semaphore(OSRM_CONCURRENCY)
+
+    async def get_shortest_path(points: tuple) -> tuple | float:
+        # Round to about 1 meter, like get_shortest_path_osrm.
+        points = tuple(round(point, 5) for point in points)
+        cache_key = get_osrm_cache_key(*points, return_geometry)
+        result = await cache_get(cache_key)
+        if result is None:
+            async with semaphore:
+                response = await client.get(
+                    OSRM_URL + get_osrm_route_path(*points, return_geometry)
+                )
+            result = parse_osrm_route(
+                decode_osrm_response(response), return_geometry
+            )
+            await cache_set(cache_key, result)
+        return result
+
+    tasks = [get_shortest_path(points) for points in points_pairs]
+    return await asyncio.gather(*tasks)
 
 
 def calculate_geo_distance(points: list) -> float:
@@ -116,6 +434,68 @@ def calculate_geo_distance(points: list) -> float:
 
     """
     if points and len(points) == 2:
-        distance = geodesic(points[0][::-1], points[1][::-1]).km
-        return round(distance, 3)
+        start, end = points
+        # Points are (longitude, latitude).
+        distance = haversine_distance(start[1], start[0], end[1], end[0])
+        return round(float(distance) / 1000, 3)
     return 0
+
+
+def haversine_distance(
+    lat1: float | np.ndarray,
+    lon1: float | np.ndarray,
+    lat2: float | np.ndarray,
+    lon2: float | np.ndarray,
+) -> float | np.ndarray:
+    """
+    Calculate the great-circle distance between points using the haversine
+    formula.
+
+    Inputs are in degrees and may be scalars or NumPy arrays, which are
+    broadcast against each other, so the distance from one point to every
+    point of a route is computed in a single vectorized call.
+
+    Args:
+        lat1 (float | np.ndarray): Latitude(s) of the first point(s).
+        lon1 (float | np.ndarray): Longitude(s) of the first point(s).
+        lat2 (float | np.ndarray): Latitude(s) of the second point(s).
+        lon2 (float | np.ndarray): Longitude(s) of the second point(s).
+
+    Returns:
+        float | np.ndarray: Distance(s) in meters.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def equirectangular_distance(
+    lat1: float | np.ndarray,
+    lon1: float | np.ndarray,
+    lat2: float | np.ndarray,
+    lon2: float | np.ndarray,
+) -> float | np.ndarray:
+    """
+    Approximate the distance between points using an equirectangular
+    projection.
+
+    This is cheaper than the haversine formula and accurate to well within
+    1% for points up to a few kilometers apart, which is enough for
+    threshold checks of nearby points. Inputs are broadcast like in
+    `haversine_distance`.
+
+    Args:
+        lat1 (float | np.ndarray): Latitude(s) of the first point(s).
+        lon1 (float | np.ndarray): Longitude(s) of the first point(s).
+        lat2 (float | np.ndarray): Latitude(s) of the second point(s).
+        lon2 (float | np.ndarray): Longitude(s) of the second point(s).
+
+    Returns:
+        float | np.ndarray: Approximate distance(s) in meters.
+    """
+    d_lat = np.radians(lat2 - lat1)
+    d_lon = np.radians(lon2 - lon1) * np.cos(np.radians((lat1 + lat2) / 2))
+    return EARTH_RADIUS_M * np.hypot(d_lat, d_lon)
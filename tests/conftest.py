@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Settings read at import time by the package modules.
+os.environ.setdefault("MAPBOX_SECRET", "test")
+os.environ.setdefault("MAPBOX_STYLE", "open-street-map")
+os.environ.setdefault(
+    "CACHE_DIR", os.path.join(tempfile.gettempdir(), "gpx_route_status_test")
+)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from gpx_route_status.plot_route import build_route_index
+from gpx_route_status.utils import haversine_distance
+
+RADIUS = 60
+
+
+@pytest.mark.parametrize("base_lat", [35.0, 43.0, -33.9])
+def test_build_route_index_matches_brute_force(base_lat):
+    rng = np.random.default_rng(0)
+    # A winding route of about 2 km with points every few meters.
+    steps = rng.normal(scale=2e-5, size=(2000, 2)).cumsum(axis=0)
+    latitudes = base_lat + steps[:, 0]
+    longitudes = 139.0 + steps[:, 1]
+    find_points_within = build_route_index(latitudes, longitudes, RADIUS)
+
+    queries = np.column_stack([latitudes, longitudes])[::50] + rng.normal(
+        scale=3e-4, size=(40, 2)
+    )
+    for lat, lon in queries:
+        distances = haversine_distance(latitudes, longitudes, lat, lon)
+        found = find_points_within(lat, lon)
+        # The index measures equirectangular distances, skip points whose
+        # distance is too close to the radius to tell the formulas apart.
+        clear = np.abs(distances - RADIUS) > 0.01
+        expected = np.flatnonzero((distances < RADIUS) & clear)
+        assert np.array_equal(np.sort(found), found)
+        assert np.array_equal(found[clear[found]], expected)
@@ -0,0 +1,50 @@
+import random
+import re
+from unicodedata import normalize
+
+import pytest
+
+from gpx_route_status.postprocessing import (
+    clean_road_names,
+    get_trailing_road_number,
+)
+
+
+def clean_road_names_reference(road_name: str) -> str:
+    road_name = normalize("NFKC", road_name)
+    match = re.search(r"\d+号", road_name)
+    return match.group() if match else road_name
+
+
+@pytest.mark.parametrize(
+    "road_name",
+    [
+        "国道1号",
+        "国道１２号",
+        "県道123号",
+        "国道1号バイパス",
+        "国道1号2号",
+        "①23号",
+        "国道٣号",
+        "号",
+        "Chuo Dori",
+        "",
+    ],
+)
+def test_clean_road_names_matches_reference(road_name):
+    assert clean_road_names(road_name) == clean_road_names_reference(road_name)
+
+
+def test_get_trailing_road_number_matches_reference():
+    rng = random.Random(0)
+    alphabet = list("国道県1234567890１２３号号a ①²٣-")
+    for _ in range(20000):
+        road_name = "".join(
+            rng.choice(alphabet) for _ in range(rng.randint(0, 7))
+        )
+        road_number = get_trailing_road_number(road_name)
+        if road_number is not None:
+            assert road_number == clean_road_names_reference(road_name)
+        assert clean_road_names.__wrapped__(
+            road_name
+        ) == clean_road_names_reference(road_name)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from gpx_route_status.utils import haversine_distance, sample_points
+
+
+def get_route_distances(coordinates: np.ndarray) -> np.ndarray:
+    segment_lengths = haversine_distance(
+        coordinates[:-1, 0],
+        coordinates[:-1, 1],
+        coordinates[1:, 0],
+        coordinates[1:, 1],
+    )
+    return np.concatenate(([0.0], np.cumsum(segment_lengths)))
+
+
+@pytest.mark.parametrize("interval_m", [50, 100, 333])
+def test_sample_points_spacing(interval_m):
+    rng = np.random.default_rng(0)
+    # Uneven point spacing, like GPX recordings with a varying rate.
+    steps = rng.uniform(0, 2e-4, size=(1000, 2))
+    coordinates = np.vstack([[35.0, 139.0], 35.0 + steps.cumsum(axis=0)])
+    distances = get_route_distances(coordinates)
+    max_step = np.diff(distances).max()
+
+    sampled = sample_points(coordinates, interval_m=interval_m)
+    assert np.array_equal(sampled[0], coordinates[0])
+    # Route points are distinct, so each sample maps to a single index.
+    idx = np.array(
+        [
+            np.flatnonzero((coordinates == point).all(axis=1))[0]
+            for point in sampled
+        ]
+    )
+    assert np.all(np.diff(idx) > 0)
+    # Each sample is the first point at or after its target distance.
+    targets = np.arange(len(sampled)) * interval_m
+    assert np.all(distances[idx] >= targets)
+    assert np.all(distances[idx] - targets < max_step)
+
+
+def test_sample_points_zero_length_route():
+    coordinates = np.array([[35.0, 139.0], [35.0, 139.0]])
+    sampled = sample_points(coordinates, interval_m=100)
+    assert np.array_equal(sampled, coordinates[:1])
+
+
+def test_sample_points_small_interval_has_no_duplicates():
+    coordinates = np.column_stack(
+        [35.0 + np.linspace(0, 0.01, 5), np.full(5, 139.0)]
+    )
+    sampled = sample_points(coordinates, interval_m=1e-3)
+    assert np.array_equal(sampled, coordinates)
+
+
+@pytest.mark.parametrize("interval_m", [0, -5])
+def test_sample_points_rejects_non_positive_interval(interval_m):
+    coordinates = np.array([[35.0, 139.0], [35.1, 139.1]])
+    with pytest.raises(ValueError):
+        sample_points(coordinates, interval_m=interval_m)